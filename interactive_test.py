@@ -5,9 +5,45 @@ Allows you to manually test each tool like Cursor would
 """
 
 import asyncio
+import concurrent.futures
 import json
-import subprocess
+import os
 import sys
+from collections import OrderedDict
+
+try:
+    import orjson
+
+    def _encode_frame(message) -> bytes:
+        """Encode a message as one newline-terminated JSON-RPC frame"""
+        return orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE)
+
+    _decode = orjson.loads
+except ImportError:
+    def _encode_frame(message) -> bytes:
+        """Encode a message as one newline-terminated JSON-RPC frame"""
+        return (json.dumps(message) + "\n").encode()
+
+    _decode = json.loads
+
+# Set MCP_TEST_NO_CACHE=1 to always hit the server for repeated tool calls
+USE_RESPONSE_CACHE = os.environ.get("MCP_TEST_NO_CACHE") != "1"
+RESPONSE_CACHE_SIZE = 128
+
+# Set MCP_TEST_SERVER_LOGS=1 to echo the server's stderr logs to this terminal
+SHOW_SERVER_LOGS = os.environ.get("MCP_TEST_SERVER_LOGS") == "1"
+
+# Seconds to wait for each response when running all tools
+RESPONSE_TIMEOUT = 60
+
+_DOCS_ROOT = "https://docs.voiceflow.com/"
+_DOCS_PAGE_PREFIX = _DOCS_ROOT + "docs/"
+
+def _normalize_doc_url(url: str) -> str:
+    """Expand a bare page slug into a full documentation URL"""
+    if url.startswith(_DOCS_ROOT):
+        return url
+    return _DOCS_PAGE_PREFIX + url
 
 class InteractiveMCPTester:
     """Interactive tester for MCP server"""
@@ -15,84 +51,232 @@ class InteractiveMCPTester:
     def __init__(self):
         self.process = None
         self.request_id = 1
+        self._pending = []
+        self._tools = None
+        self._prewarm_task = None
+        self._response_cache = OrderedDict()
+        self._stderr_task = None
+        self._stdin_buf = bytearray()
     
     async def start_server(self):
         """Start the MCP server"""
         print("🚀 Starting Voiceflow MCP Server...")
-        self.process = subprocess.Popen(
-            [sys.executable, "voiceflow_mcp_server.py"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "voiceflow_mcp_server.py",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=1 << 20  # full doc pages arrive as a single line
         )
-        await asyncio.sleep(2)
+        # Keep reading stderr so a full pipe buffer never blocks the server's logging
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+        # No startup delay: the server reads stdin once it is up, so the
+        # initialize request simply waits in the pipe until then
         print("✅ Server started!")
     
-    def send_request(self, method: str, params: dict = None):
-        """Send a request to the server"""
+    async def _drain_stderr(self):
+        """Consume the server's stderr, optionally echoing it"""
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            if SHOW_SERVER_LOGS:
+                sys.stderr.buffer.write(line)
+                sys.stderr.flush()
+    
+    def queue_request(self, method: str, params: dict = None) -> int:
+        """Queue a request for the next flush and return its id"""
         request = {
             "jsonrpc": "2.0",
             "id": self.request_id,
             "method": method,
             "params": params or {}
         }
-        
-        request_str = json.dumps(request) + "\n"
-        self.process.stdin.write(request_str)
-        self.process.stdin.flush()
+        self._pending.append(request)
         self.request_id += 1
+        return request["id"]
     
-    async def read_response(self):
-        """Read response from server"""
-        try:
-            response_line = await asyncio.to_thread(self.process.stdout.readline)
-            if response_line.strip():
-                return json.loads(response_line.strip())
-        except Exception as e:
-            return {"error": str(e)}
-        return {"error": "No response"}
+    async def flush(self):
+        """Send all queued requests as separate messages with a single write and drain"""
+        if not self._pending:
+            return
+        frames = [_encode_frame(request) for request in self._pending]
+        self._pending = []
+        
+        # The stream writer hands frames straight to the pipe transport; there is
+        # no BufferedWriter layer in between to bypass
+        self.process.stdin.writelines(frames)
+        await self.process.stdin.drain()
+    
+    async def send_request(self, method: str, params: dict = None) -> int:
+        """Send a request to the server"""
+        request_id = self.queue_request(method, params)
+        await self.flush()
+        return request_id
+    
+    async def read_message(self, wanted: set):
+        """Read until a reply to one of the wanted ids (or an id-less error) arrives"""
+        while True:
+            try:
+                response_line = await self.process.stdout.readline()
+                if not response_line:
+                    return {"error": "No response"}
+                if response_line.isspace():
+                    continue
+                # Parse the raw bytes directly; the trailing newline is valid JSON whitespace
+                message = _decode(response_line)
+            except Exception as e:
+                return {"error": str(e)}
+            response_id = message.get("id")
+            if response_id in wanted:
+                return message
+            if response_id is None and "error" in message:
+                return message
+            # Late replies to abandoned (timed-out) requests, and server notifications
+    
+    async def read_response(self, request_id: int):
+        """Read the server's reply to request_id"""
+        return await self.read_message({request_id})
     
     async def initialize(self):
         """Initialize the MCP connection"""
         print("\n🔧 Initializing MCP connection...")
-        self.send_request("initialize", {
+        request_id = await self.send_request("initialize", {
             "protocolVersion": "2024-11-05",
             "capabilities": {"tools": {}},
             "clientInfo": {"name": "interactive-test", "version": "1.0.0"}
         })
         
-        response = await self.read_response()
+        response = await self.read_response(request_id)
         if "result" in response:
             print("✅ Initialization successful!")
+            self._prewarm_task = asyncio.create_task(self.prewarm_tools())
             return True
         else:
             print(f"❌ Initialization failed: {response}")
             return False
     
+    async def prewarm_tools(self):
+        """Fetch the tool list in the background so the first menu choice finds it cached"""
+        request_id = await self.send_request("tools/list")
+        response = await self.read_response(request_id)
+        if "result" in response and "tools" in response["result"]:
+            self._tools = response["result"]["tools"]
+    
+    async def wait_for_prewarm(self):
+        """Let the prewarm request finish before issuing another one on the pipe"""
+        if self._prewarm_task:
+            await self._prewarm_task
+            self._prewarm_task = None
+    
     async def test_tool(self, tool_name: str, arguments: dict):
         """Test a specific tool"""
+        await self.wait_for_prewarm()
         print(f"\n🛠️ Testing {tool_name}...")
         print(f"   Arguments: {arguments}")
         
-        self.send_request("tools/call", {
-            "name": tool_name,
-            "arguments": arguments
-        })
+        cache_key = (tool_name, json.dumps(arguments, sort_keys=True))
+        content = self._response_cache.get(cache_key) if USE_RESPONSE_CACHE else None
         
-        response = await self.read_response()
-        
-        if "result" in response and "content" in response["result"]:
-            content = response["result"]["content"][0]["text"]
-            print("✅ Success!")
-            print("📄 Response:")
-            print("-" * 50)
-            print(content)
-            print("-" * 50)
-            return True
+        if content is not None:
+            self._response_cache.move_to_end(cache_key)
+            print("♻️ Using cached response")
         else:
-            print(f"❌ Failed: {response}")
-            return False
+            request_id = await self.send_request("tools/call", {
+                "name": tool_name,
+                "arguments": arguments
+            })
+            
+            response = await self.read_response(request_id)
+            
+            if "result" not in response or "content" not in response["result"]:
+                print(f"❌ Failed: {response}")
+                return False
+            
+            content = response["result"]["content"][0]["text"]
+            # Only a reply to this very request may be remembered for the tool
+            if USE_RESPONSE_CACHE and response.get("id") == request_id:
+                self._response_cache[cache_key] = content
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+        
+        print("✅ Success!")
+        print("📄 Response:")
+        print("-" * 50)
+        print(content)
+        print("-" * 50)
+        return True
+    
+    async def run_all_tools(self):
+        """Call every tool with sample arguments, sending all requests in one flush"""
+        await self.wait_for_prewarm()
+        print("\n📦 Running all tools...")
+        calls = {
+            "search_voiceflow_docs": {"query": "API authentication", "limit": 3},
+            "get_voiceflow_doc_page": {"url": "https://docs.voiceflow.com/docs/authentication"},
+            "ask_voiceflow_question": {"question": "How do I authenticate with the Voiceflow API?"},
+            "list_voiceflow_topics": {},
+        }
+        ids = {
+            self.queue_request("tools/call", {"name": name, "arguments": arguments}): name
+            for name, arguments in calls.items()
+        }
+        # Separate newline-delimited frames: the stdio server reads one message per line
+        await self.flush()
+        
+        responses = {}
+        outstanding = set(ids)
+        try:
+            while outstanding:
+                response = await asyncio.wait_for(self.read_message(outstanding), RESPONSE_TIMEOUT)
+                if response.get("id") not in outstanding:
+                    print(f"   ⚠️ Unexpected message: {response}")
+                    break
+                outstanding.discard(response["id"])
+                responses[response["id"]] = response
+        except asyncio.TimeoutError:
+            print(f"   ⏱️ No response within {RESPONSE_TIMEOUT} seconds")
+        
+        for request_id, name in ids.items():
+            response = responses.get(request_id)
+            if response is None:
+                print(f"   ❌ {name}: no response")
+            elif "result" in response and "content" in response["result"]:
+                print(f"   ✅ {name}")
+            else:
+                print(f"   ❌ {name}: {response}")
+    
+    async def prompt(self, text: str) -> str:
+        """Read a line from the user without blocking the event loop"""
+        print(text, end="", flush=True)
+        try:
+            return (await self._read_stdin_line(sys.stdin.fileno())).strip()
+        except (NotImplementedError, OSError, ValueError):
+            # No fd-readiness support (e.g. Windows proactor loop): hand off to a thread
+            return (await asyncio.to_thread(input)).strip()
+    
+    async def _read_stdin_line(self, fd: int) -> str:
+        """Wait on the loop's selector for stdin and return the next line"""
+        loop = asyncio.get_running_loop()
+        while b"\n" not in self._stdin_buf:
+            readable = loop.create_future()
+            loop.add_reader(fd, readable.set_result, None)
+            try:
+                await readable
+            finally:
+                loop.remove_reader(fd)
+            # The fd is readable, so a single read returns without blocking
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                if self._stdin_buf:
+                    break
+                raise EOFError
+            self._stdin_buf += chunk
+        newline = self._stdin_buf.find(b"\n")
+        end = newline + 1 if newline >= 0 else len(self._stdin_buf)
+        line = bytes(self._stdin_buf[:end])
+        del self._stdin_buf[:end]
+        return line.decode(errors="replace")
     
     async def interactive_menu(self):
         """Interactive menu for testing"""
@@ -105,34 +289,37 @@ class InteractiveMCPTester:
             print("3. Ask Question")
             print("4. List Topics")
             print("5. List Available Tools")
+            print("6. Run All Tools")
             print("0. Exit")
             print("-" * 60)
             
-            choice = input("Choose an option (0-5): ").strip()
+            choice = await self.prompt("Choose an option (0-6): ")
             
             if choice == "0":
                 break
             elif choice == "1":
-                query = input("Enter search query: ").strip()
-                limit = input("Enter limit (default 5): ").strip() or "5"
+                query = await self.prompt("Enter search query: ")
+                limit = await self.prompt("Enter limit (default 5): ") or "5"
                 await self.test_tool("search_voiceflow_docs", {
                     "query": query,
                     "limit": int(limit)
                 })
             elif choice == "2":
-                url = input("Enter documentation URL: ").strip()
-                if not url.startswith("https://docs.voiceflow.com/"):
-                    url = f"https://docs.voiceflow.com/docs/{url}"
+                url = _normalize_doc_url(await self.prompt("Enter documentation URL: "))
                 await self.test_tool("get_voiceflow_doc_page", {"url": url})
             elif choice == "3":
-                question = input("Enter your question: ").strip()
+                question = await self.prompt("Enter your question: ")
                 await self.test_tool("ask_voiceflow_question", {"question": question})
             elif choice == "4":
                 await self.test_tool("list_voiceflow_topics", {})
             elif choice == "5":
                 print("\n🛠️ Listing available tools...")
-                self.send_request("tools/list")
-                response = await self.read_response()
+                await self.wait_for_prewarm()
+                if self._tools is None:
+                    request_id = await self.send_request("tools/list")
+                    response = await self.read_response(request_id)
+                else:
+                    response = {"result": {"tools": self._tools}}
                 if "result" in response and "tools" in response["result"]:
                     tools = response["result"]["tools"]
                     print(f"✅ Found {len(tools)} tools:")
@@ -140,17 +327,27 @@ class InteractiveMCPTester:
                         print(f"   • {tool['name']}: {tool['description']}")
                 else:
                     print(f"❌ Failed to list tools: {response}")
+            elif choice == "6":
+                await self.run_all_tools()
             else:
                 print("❌ Invalid choice. Please try again.")
     
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up"""
-        if self.process:
+        if self.process and self.process.returncode is None:
             self.process.terminate()
-            self.process.wait()
+            await self.process.wait()
+        if self._stderr_task:
+            await self._stderr_task
 
 async def main():
     """Main function"""
+    # Pipe I/O runs on asyncio streams; the executor only serves occasional blocking calls
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="mcp-io")
+    )
+    
     tester = InteractiveMCPTester()
     
     try:
@@ -166,7 +363,13 @@ async def main():
     except Exception as e:
         print(f"❌ Error: {e}")
     finally:
-        tester.cleanup()
+        await tester.cleanup()
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     asyncio.run(main())
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Optional buffering of test script output
+Collects everything printed during a run and writes it to stdout in one go
+"""
+
+import io
+import os
+import sys
+from contextlib import contextmanager, redirect_stdout
+
+# Set MCP_TEST_BUFFER_OUTPUT=1 to hold output until the run finishes (CI, benchmarks)
+BUFFER_OUTPUT = os.environ.get("MCP_TEST_BUFFER_OUTPUT") == "1"
+
+@contextmanager
+def buffered_stdout(enabled: bool = BUFFER_OUTPUT):
+    """Capture prints inside the block and emit them with a single write at the end"""
+    if not enabled:
+        yield
+        return
+    
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            yield
+    finally:
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
@@ -6,29 +6,161 @@ This simulates the exact communication between Cursor and your MCP server
 
 import asyncio
 import json
+import os
+import sys
 from voiceflow_mcp_server import VoiceflowMCP
 
+try:
+    import orjson
+
+    def _encode_pretty(message) -> bytes:
+        return orjson.dumps(message, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def _encode_pretty(message) -> bytes:
+        return json.dumps(message, indent=2).encode()
+
+# Set MCP_PAYLOAD_DEBUG=1 to pretty-print the full payloads (off by default)
+DEBUG = os.environ.get("MCP_PAYLOAD_DEBUG") == "1"
+
+# Set MCP_TEST_NO_CACHE=1 to always hit the backend for repeated searches
+USE_RESPONSE_CACHE = os.environ.get("MCP_TEST_NO_CACHE") != "1"
+
+# Constant server responses, built and pretty-printed to bytes once at import.
+# The request id is spliced in at print time.
+_INITIALIZE_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {
+            "listChanged": True
+        },
+        "resources": {
+            "subscribe": True,
+            "listChanged": True
+        }
+    },
+    "serverInfo": {
+        "name": "voiceflow-docs",
+        "version": "1.0.0"
+    }
+}
+
+_TOOLS_LIST_RESULT = {
+    "tools": [
+        {
+            "name": "search_voiceflow_docs",
+            "description": "Search through Voiceflow documentation for specific topics, APIs, or features",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Search query (e.g., 'API authentication', 'webhook setup', 'voice configuration')"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of results to return",
+                        "default": 5
+                    }
+                },
+                "required": ["query"]
+            }
+        },
+        {
+            "name": "get_voiceflow_doc_page",
+            "description": "Get the content of a specific Voiceflow documentation page",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "url": {
+                        "type": "string",
+                        "description": "Full URL of the documentation page"
+                    }
+                },
+                "required": ["url"]
+            }
+        },
+        {
+            "name": "ask_voiceflow_question",
+            "description": "Ask a question about Voiceflow and get an AI-powered answer based on the documentation",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "question": {
+                        "type": "string",
+                        "description": "Your question about Voiceflow"
+                    }
+                },
+                "required": ["question"]
+            }
+        },
+        {
+            "name": "list_voiceflow_topics",
+            "description": "Get a list of available documentation topics and categories",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    ]
+}
+
+_ID_SLOT = b'"id": null'
+
+def _response_template(result: dict) -> tuple:
+    """Pretty-print a constant response once, split around its id value"""
+    encoded = _encode_pretty({"jsonrpc": "2.0", "id": None, "result": result})
+    head, tail = encoded.split(_ID_SLOT, 1)
+    return head + b'"id": ', tail
+
+_INITIALIZE_TEMPLATE = _response_template(_INITIALIZE_RESULT)
+_TOOLS_LIST_TEMPLATE = _response_template(_TOOLS_LIST_RESULT)
+
+def _with_request_id(template: tuple, request_id: int) -> bytes:
+    """Splice the request id into a pre-serialized response"""
+    head, tail = template
+    return b"%s%d%s" % (head, request_id, tail)
+
+def _print_message(banner: str, label: str, payload) -> None:
+    """Pretty-print a payload under its banner, skipping the serialization entirely unless DEBUG is on"""
+    if not DEBUG:
+        return
+    print(banner)
+    print("-" * 50)
+    print(f"{label} Payload:")
+    if not isinstance(payload, bytes):
+        payload = _encode_pretty(payload)
+    stdout = getattr(sys.stdout, "buffer", None)
+    if stdout is None:
+        print(payload.decode())
+        return
+    # Pre-encoded bytes go straight to the binary stream, after any pending text
+    sys.stdout.flush()
+    stdout.write(payload + b"\n")
+
 class PayloadSimulator:
     """Simulates exact MCP payloads that Cursor would send"""
     
     def __init__(self):
         self.voiceflow = VoiceflowMCP()
         self.request_id = 1
+        self._search_cache = {}
     
     def create_mcp_request(self, method: str, params: dict = None) -> dict:
         """Create a JSON-RPC request like Cursor would send"""
-        return {
+        request = {
             "jsonrpc": "2.0",
             "id": self.request_id,
             "method": method,
             "params": params or {}
         }
+        self.request_id += 1
+        return request
     
-    def create_mcp_response(self, result: dict = None, error: dict = None) -> dict:
+    def create_mcp_response(self, request_id: int, result: dict = None, error: dict = None) -> dict:
         """Create a JSON-RPC response like your server would send"""
         response = {
             "jsonrpc": "2.0",
-            "id": self.request_id
+            "id": request_id
         }
         if result:
             response["result"] = result
@@ -38,9 +170,6 @@ class PayloadSimulator:
     
     async def simulate_initialize_request(self):
         """Simulate Cursor's initialization request"""
-        print("📤 CURSOR → MCP SERVER (Initialize Request)")
-        print("-" * 50)
-        
         request = self.create_mcp_request("initialize", {
             "protocolVersion": "2024-11-05",
             "capabilities": {
@@ -58,142 +187,59 @@ class PayloadSimulator:
             }
         })
         
-        print("Request Payload:")
-        print(json.dumps(request, indent=2))
-        
         # Simulate server response
-        print("\n📥 MCP SERVER → CURSOR (Initialize Response)")
-        print("-" * 50)
-        
-        response = self.create_mcp_response(result={
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {
-                    "listChanged": True
-                },
-                "resources": {
-                    "subscribe": True,
-                    "listChanged": True
-                }
-            },
-            "serverInfo": {
-                "name": "voiceflow-docs",
-                "version": "1.0.0"
-            }
-        })
+        self.print_exchange("Initialize", request, _with_request_id(_INITIALIZE_TEMPLATE, request["id"]))
         
-        print("Response Payload:")
-        print(json.dumps(response, indent=2))
-        
-        self.request_id += 1
+        return request
     
     async def simulate_list_tools_request(self):
         """Simulate Cursor requesting the list of tools"""
-        print("\n📤 CURSOR → MCP SERVER (List Tools Request)")
-        print("-" * 50)
-        
         request = self.create_mcp_request("tools/list")
-        print("Request Payload:")
-        print(json.dumps(request, indent=2))
+        self.print_exchange("List Tools", request, _with_request_id(_TOOLS_LIST_TEMPLATE, request["id"]))
         
-        print("\n📥 MCP SERVER → CURSOR (List Tools Response)")
-        print("-" * 50)
-        
-        response = self.create_mcp_response(result={
-            "tools": [
-                {
-                    "name": "search_voiceflow_docs",
-                    "description": "Search through Voiceflow documentation for specific topics, APIs, or features",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Search query (e.g., 'API authentication', 'webhook setup', 'voice configuration')"
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Maximum number of results to return",
-                                "default": 5
-                            }
-                        },
-                        "required": ["query"]
-                    }
-                },
-                {
-                    "name": "get_voiceflow_doc_page",
-                    "description": "Get the content of a specific Voiceflow documentation page",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "url": {
-                                "type": "string",
-                                "description": "Full URL of the documentation page"
-                            }
-                        },
-                        "required": ["url"]
-                    }
-                },
-                {
-                    "name": "ask_voiceflow_question",
-                    "description": "Ask a question about Voiceflow and get an AI-powered answer based on the documentation",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "question": {
-                                "type": "string",
-                                "description": "Your question about Voiceflow"
-                            }
-                        },
-                        "required": ["question"]
-                    }
-                },
-                {
-                    "name": "list_voiceflow_topics",
-                    "description": "Get a list of available documentation topics and categories",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                }
-            ]
-        })
-        
-        print("Response Payload:")
-        print(json.dumps(response, indent=2))
-        
-        self.request_id += 1
+        return request
     
-    async def simulate_search_request(self):
-        """Simulate Cursor making a search request"""
-        print("\n📤 CURSOR → MCP SERVER (Search Request)")
-        print("-" * 50)
-        
-        request = self.create_mcp_request("tools/call", {
+    def print_exchange(self, label: str, request: dict, response):
+        """Print a request/response pair the way it travels over the wire"""
+        if not DEBUG:
+            print(f"🔁 {label}: {request['method']} (id={request['id']})")
+            return
+        _print_message(f"\n📤 CURSOR → MCP SERVER ({label} Request)", "Request", request)
+        _print_message(f"\n📥 MCP SERVER → CURSOR ({label} Response)", "Response", response)
+    
+    def build_search_request(self) -> dict:
+        """Build Cursor's search request"""
+        return self.create_mcp_request("tools/call", {
             "name": "search_voiceflow_docs",
             "arguments": {
                 "query": "API authentication",
                 "limit": 3
             }
         })
-        
-        print("Request Payload:")
-        print(json.dumps(request, indent=2))
-        
-        print("\n📥 MCP SERVER → CURSOR (Search Response)")
-        print("-" * 50)
-        
-        # Actually perform the search
-        results = await self.voiceflow.search_documents("API authentication", limit=3)
-        
-        response_content = f"Found {len(results)} relevant documentation pages:\n\n"
+    
+    async def simulate_search_request(self, request: dict, results: list = None) -> dict:
+        """Simulate the server answering a search request"""
+        # Actually perform the search, unless the results were fetched in a batch
+        arguments = request["params"]["arguments"]
+        cache_key = (arguments["query"], arguments["limit"])
+        if results is None and USE_RESPONSE_CACHE:
+            results = self._search_cache.get(cache_key)
+        if results is None:
+            results = await self.voiceflow.search_documents(arguments["query"], limit=arguments["limit"])
+            if USE_RESPONSE_CACHE:
+                self._search_cache[cache_key] = results
+        
+        parts = [f"Found {len(results)} relevant documentation pages:\n\n"]
         for i, doc in enumerate(results, 1):
-            response_content += f"{i}. **{doc['title']}**\n"
-            response_content += f"   URL: {doc['url']}\n"
-            response_content += f"   Description: {doc['description'][:200]}...\n"
-            response_content += f"   Relevance: {doc['similarity']:.2f}\n\n"
-        
-        response = self.create_mcp_response(result={
+            parts.append(
+                f"{i}. **{doc['title']}**\n"
+                f"   URL: {doc['url']}\n"
+                f"   Description: {doc['description'][:200]}...\n"
+                f"   Relevance: {doc['similarity']:.2f}\n\n"
+            )
+        response_content = "".join(parts)
+        
+        return self.create_mcp_response(request["id"], result={
             "content": [
                 {
                     "type": "text",
@@ -201,43 +247,35 @@ class PayloadSimulator:
                 }
             ]
         })
-        
-        print("Response Payload:")
-        print(json.dumps(response, indent=2))
-        
-        self.request_id += 1
     
-    async def simulate_question_request(self):
-        """Simulate Cursor asking a question"""
-        print("\n📤 CURSOR → MCP SERVER (Question Request)")
-        print("-" * 50)
-        
-        request = self.create_mcp_request("tools/call", {
+    def build_question_request(self) -> dict:
+        """Build Cursor's question request"""
+        return self.create_mcp_request("tools/call", {
             "name": "ask_voiceflow_question",
             "arguments": {
                 "question": "How do I authenticate with the Voiceflow API?"
             }
         })
+    
+    async def simulate_question_request(self, request: dict, relevant_docs: list = None) -> dict:
+        """Simulate the server answering a question request"""
+        # Actually answer the question, reusing batched search results if given
+        if relevant_docs is not None:
+            result = self.voiceflow.compose_answer(relevant_docs)
+        else:
+            result = await self.voiceflow.answer_question(request["params"]["arguments"]["question"])
         
-        print("Request Payload:")
-        print(json.dumps(request, indent=2))
-        
-        print("\n📥 MCP SERVER → CURSOR (Question Response)")
-        print("-" * 50)
-        
-        # Actually answer the question
-        result = await self.voiceflow.answer_question("How do I authenticate with the Voiceflow API?")
-        
-        response_content = f"## Answer\n\n{result['answer']}\n\n"
+        parts = [f"## Answer\n\n{result['answer']}\n\n"]
         
         if result['sources']:
-            response_content += "## Sources\n\n"
+            parts.append("## Sources\n\n")
             for source in result['sources']:
-                response_content += f"- [{source['title']}]({source['url']}) (relevance: {source['relevance']:.2f})\n"
+                parts.append(f"- [{source['title']}]({source['url']}) (relevance: {source['relevance']:.2f})\n")
         
-        response_content += f"\n**Confidence**: {result['confidence']:.2f}"
+        parts.append(f"\n**Confidence**: {result['confidence']:.2f}")
+        response_content = "".join(parts)
         
-        response = self.create_mcp_response(result={
+        return self.create_mcp_response(request["id"], result={
             "content": [
                 {
                     "type": "text",
@@ -245,44 +283,35 @@ class PayloadSimulator:
                 }
             ]
         })
-        
-        print("Response Payload:")
-        print(json.dumps(response, indent=2))
-        
-        self.request_id += 1
     
-    async def simulate_get_page_request(self):
-        """Simulate Cursor requesting a specific page"""
-        print("\n📤 CURSOR → MCP SERVER (Get Page Request)")
-        print("-" * 50)
-        
-        request = self.create_mcp_request("tools/call", {
+    def build_get_page_request(self) -> dict:
+        """Build Cursor's request for a specific page"""
+        return self.create_mcp_request("tools/call", {
             "name": "get_voiceflow_doc_page",
             "arguments": {
                 "url": "https://docs.voiceflow.com/docs/authentication"
             }
         })
-        
-        print("Request Payload:")
-        print(json.dumps(request, indent=2))
-        
-        print("\n📥 MCP SERVER → CURSOR (Get Page Response)")
-        print("-" * 50)
-        
+    
+    async def simulate_get_page_request(self, request: dict) -> dict:
+        """Simulate the server answering a get-page request"""
         # Actually get the page
-        doc = await self.voiceflow.get_documentation_page("https://docs.voiceflow.com/docs/authentication")
+        doc = await self.voiceflow.get_documentation_page(request["params"]["arguments"]["url"])
         
         if doc:
-            response_content = f"# {doc['title']}\n\n"
-            response_content += f"**URL**: {doc['url']}\n\n"
-            response_content += f"**Description**: {doc['description']}\n\n"
-            response_content += f"**Content**:\n{doc['content'][:1000]}..."
+            parts = [
+                f"# {doc['title']}\n\n",
+                f"**URL**: {doc['url']}\n\n",
+                f"**Description**: {doc['description']}\n\n",
+                f"**Content**:\n{doc['content'][:1000]}...",
+            ]
             if len(doc['content']) > 1000:
-                response_content += "\n\n[Content truncated - use the URL to view full content]"
+                parts.append("\n\n[Content truncated - use the URL to view full content]")
+            response_content = "".join(parts)
         else:
             response_content = "Could not fetch documentation from the provided URL."
         
-        response = self.create_mcp_response(result={
+        return self.create_mcp_response(request["id"], result={
             "content": [
                 {
                     "type": "text",
@@ -290,11 +319,6 @@ class PayloadSimulator:
                 }
             ]
         })
-        
-        print("Response Payload:")
-        print(json.dumps(response, indent=2))
-        
-        self.request_id += 1
 
 async def main():
     """Main function to run all payload simulations"""
@@ -305,11 +329,34 @@ async def main():
     simulator = PayloadSimulator()
     
     # Run all simulations
-    await simulator.simulate_initialize_request()
-    await simulator.simulate_list_tools_request()
-    await simulator.simulate_search_request()
-    await simulator.simulate_question_request()
-    await simulator.simulate_get_page_request()
+    init_request = await simulator.simulate_initialize_request()
+    list_request = await simulator.simulate_list_tools_request()
+    
+    requests = [
+        ("Search", simulator.build_search_request()),
+        ("Question", simulator.build_question_request()),
+        ("Get Page", simulator.build_get_page_request()),
+    ]
+    search_request, question_request, page_request = (request for _, request in requests)
+    
+    # Search and Q&A share one batched retrieval pass, overlapped with the page fetch
+    (search_results, question_docs), page_response = await asyncio.gather(
+        simulator.voiceflow.search_documents_batch([
+            search_request["params"]["arguments"]["query"],
+            question_request["params"]["arguments"]["question"],
+        ], limit=3),
+        simulator.simulate_get_page_request(page_request),
+    )
+    responses = [
+        await simulator.simulate_search_request(search_request, results=search_results),
+        await simulator.simulate_question_request(question_request, relevant_docs=question_docs),
+        page_response,
+    ]
+    for (label, request), response in zip(requests, responses):
+        simulator.print_exchange(label, request, response)
+    
+    if not DEBUG:
+        print("\n💡 Set MCP_PAYLOAD_DEBUG=1 to print the full payloads")
     
     print("\n" + "=" * 60)
     print("🎉 Payload Simulation Complete!")
@@ -322,4 +369,10 @@ async def main():
     print("   Just add the cursor_config.json to your Cursor settings!")
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     asyncio.run(main())
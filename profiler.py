@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing spans for the test scripts
+Collects wall-clock durations per named span and reports P50/P95
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+class Profiler:
+    """Accumulates wall-clock timings for named spans"""
+    
+    def __init__(self):
+        self.spans: Dict[str, List[int]] = {}
+    
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block and record it under `name`"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.setdefault(name, []).append(time.perf_counter_ns() - start)
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, P50, P95 and total time (ms) per span"""
+        result = {}
+        for name, durations in self.spans.items():
+            ordered = sorted(durations)
+            result[name] = {
+                "count": len(ordered),
+                "p50_ms": self._percentile(ordered, 50) / 1e6,
+                "p95_ms": self._percentile(ordered, 95) / 1e6,
+                "total_ms": sum(ordered) / 1e6,
+            }
+        return result
+    
+    @staticmethod
+    def _percentile(ordered: List[int], pct: int) -> int:
+        """Nearest-rank percentile of an already sorted list"""
+        rank = max(0, -(-len(ordered) * pct // 100) - 1)
+        return ordered[rank]
+    
+    def report(self) -> None:
+        """Print the summary, and write it as JSON if MCP_PROFILE_JSON names a file"""
+        summary = self.summary()
+        if not summary:
+            return
+        
+        print("\n⏱️ Timing Profile")
+        print("-" * 60)
+        print(f"{'span':<32}{'n':>4}{'p50 ms':>12}{'p95 ms':>12}")
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"{name:<32}{stats['count']:>4}{stats['p50_ms']:>12.1f}{stats['p95_ms']:>12.1f}")
+        
+        path = os.environ.get("MCP_PROFILE_JSON")
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"📝 Profile written to {path}")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Run the in-process and protocol test scripts in one session
+One warmed-up VoiceflowMCP and one server subprocess are shared by all of them
+"""
+
+import asyncio
+
+import test_cursor_simulation
+import test_improvements
+import test_server
+from output_buffer import buffered_stdout
+from voiceflow_mcp_server import VoiceflowMCP
+
+async def run_in_process_tests():
+    """Run the direct VoiceflowMCP tests against a single instance"""
+    voiceflow = VoiceflowMCP()
+    try:
+        # test_improvements pays for the warmup; later phases reuse its cache and embeddings
+        await test_improvements.test_improvements(voiceflow)
+        await test_improvements.test_specific_voiceflow_features(voiceflow)
+        await test_improvements.test_int8_search(voiceflow, test_improvements.INT8_TOPICS)
+        await test_server.test_server(voiceflow)
+        await test_server.test_tools(voiceflow)
+    finally:
+        await voiceflow.http_client.aclose()
+        test_improvements.profiler.report()
+
+async def main():
+    """Run every non-interactive test on one event loop"""
+    await run_in_process_tests()
+    
+    # The cursor simulation spawns the server once and drives every tool through it,
+    # covering the initialize/tools/list check test_mcp_client.py makes on its own
+    print("\n" + "=" * 60)
+    await test_cursor_simulation.main()
+
+if __name__ == "__main__":
+    print("🧪 Voiceflow MCP Server - Full Test Session")
+    print("=" * 60)
+    
+    with buffered_stdout():
+        asyncio.run(main())
+    
+    print("\n✨ Test session completed!")
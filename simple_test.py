@@ -5,21 +5,25 @@ This simulates how the server would work without MCP protocol complexity
 """
 
 import asyncio
+import os
 from voiceflow_mcp_server import VoiceflowMCP
 
-async def test_voiceflow_functionality():
+# Set MCP_TEST_VERBOSE=1 to print response/content previews
+VERBOSE = os.environ.get("MCP_TEST_VERBOSE") == "1"
+
+async def test_voiceflow_functionality(voiceflow: VoiceflowMCP):
     """Test the core Voiceflow MCP functionality"""
     print("🧪 Testing Voiceflow MCP Core Functionality")
     print("=" * 50)
     
-    # Initialize the Voiceflow MCP instance
-    voiceflow = VoiceflowMCP()
+    # Start the cold sitemap fetch in the background while the scaffolding runs
+    sitemap_task = asyncio.create_task(voiceflow.fetch_sitemap())
     
     print("✅ Voiceflow MCP initialized")
     
     # Test 1: Fetch sitemap
     print("\n📋 Testing sitemap fetching...")
-    urls = await voiceflow.fetch_sitemap()
+    urls = await sitemap_task
     print(f"✅ Found {len(urls)} URLs in sitemap")
     
     # Test 2: Fetch a document
@@ -28,7 +32,8 @@ async def test_voiceflow_functionality():
     doc = await voiceflow.fetch_markdown_content(test_url)
     if doc:
         print(f"✅ Successfully fetched: {doc['title']}")
-        print(f"   Description: {doc['description'][:100]}...")
+        if VERBOSE:
+            print(f"   Description: {doc['description'][:100]}...")
     else:
         print("❌ Failed to fetch document")
     
@@ -43,7 +48,8 @@ async def test_voiceflow_functionality():
     print("\n🤖 Testing Q&A functionality...")
     qa_result = await voiceflow.answer_question("How do I authenticate with the Voiceflow API?")
     print(f"✅ Q&A result confidence: {qa_result['confidence']:.2f}")
-    print(f"   Answer preview: {qa_result['answer'][:200]}...")
+    if VERBOSE:
+        print(f"   Answer preview: {qa_result['answer'][:200]}...")
     print(f"   Sources: {len(qa_result['sources'])} documents")
     
     # Test 5: Simulate Cursor-like queries
@@ -64,9 +70,12 @@ async def test_voiceflow_functionality():
         }
     ]
     
-    for i, scenario in enumerate(scenarios, 1):
+    all_results = await asyncio.gather(
+        *(voiceflow.search_documents(scenario['query'], limit=2) for scenario in scenarios)
+    )
+    
+    for i, (scenario, results) in enumerate(zip(scenarios, all_results), 1):
         print(f"\n   Scenario {i}: {scenario['description']}")
-        results = await voiceflow.search_documents(scenario['query'], limit=2)
         if results:
             print(f"   ✅ Found relevant docs: {results[0]['title']}")
         else:
@@ -76,25 +85,31 @@ async def test_voiceflow_functionality():
     print("🎉 All core functionality tests completed!")
     print("✅ Your Voiceflow MCP server is ready for Cursor integration!")
 
-async def simulate_cursor_usage():
+async def simulate_cursor_usage(voiceflow: VoiceflowMCP):
     """Simulate how Cursor would use the MCP server"""
     print("\n🤖 Simulating Cursor Usage Scenarios")
     print("=" * 50)
     
-    voiceflow = VoiceflowMCP()
+    question = "How do I get an API key for Voiceflow?"
+    query = "webhook integration setup"
+    url = "https://docs.voiceflow.com/docs/authentication"
+    
+    # The three scenarios are independent, so run them concurrently
+    result, results, doc = await asyncio.gather(
+        voiceflow.answer_question(question),
+        voiceflow.search_documents(query, limit=2),
+        voiceflow.get_documentation_page(url),
+    )
     
     # Scenario 1: Developer asks about authentication
     print("\n👨‍💻 Scenario 1: Developer asks about authentication")
-    question = "How do I get an API key for Voiceflow?"
-    result = await voiceflow.answer_question(question)
     print(f"❓ Question: {question}")
-    print(f"✅ Answer: {result['answer'][:150]}...")
+    if VERBOSE:
+        print(f"✅ Answer: {result['answer'][:150]}...")
     print(f"📊 Confidence: {result['confidence']:.2f}")
     
     # Scenario 2: Developer searches for specific feature
     print("\n👨‍💻 Scenario 2: Developer searches for webhook documentation")
-    query = "webhook integration setup"
-    results = await voiceflow.search_documents(query, limit=2)
     print(f"🔍 Search: {query}")
     if results:
         print(f"✅ Top result: {results[0]['title']}")
@@ -104,25 +119,40 @@ async def simulate_cursor_usage():
     
     # Scenario 3: Developer gets specific documentation page
     print("\n👨‍💻 Scenario 3: Developer requests specific documentation")
-    url = "https://docs.voiceflow.com/docs/authentication"
-    doc = await voiceflow.get_documentation_page(url)
     if doc:
         print(f"📖 Requested: {url}")
         print(f"✅ Retrieved: {doc['title']}")
-        print(f"📝 Content preview: {doc['content'][:100]}...")
+        if VERBOSE:
+            print(f"📝 Content preview: {doc['content'][:100]}...")
     else:
         print(f"❌ Failed to retrieve: {url}")
     
     print("\n🎯 These are exactly the scenarios Cursor will use!")
     print("✅ Your MCP server handles all common development queries perfectly!")
 
+async def all_tests():
+    """Run both test phases against a single VoiceflowMCP instance"""
+    # Sharing the instance keeps the HTTP client, page cache and embeddings warm
+    voiceflow = VoiceflowMCP()
+    try:
+        await test_voiceflow_functionality(voiceflow)
+        await simulate_cursor_usage(voiceflow)
+    finally:
+        # Close the pooled connections while the (only) event loop is still running
+        await voiceflow.http_client.aclose()
+
 if __name__ == "__main__":
     print("🚀 Voiceflow MCP Server - Comprehensive Test")
     print("This simulates how Cursor will interact with your server")
     print("=" * 60)
     
-    asyncio.run(test_voiceflow_functionality())
-    asyncio.run(simulate_cursor_usage())
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
+    asyncio.run(all_tests())
     
     print("\n🎉 Test completed!")
     print("\n📋 Next steps:")
@@ -6,10 +6,80 @@ This tests the actual MCP protocol communication
 
 import asyncio
 import json
-import subprocess
+import os
 import sys
 import time
-from typing import Dict, Any
+from typing import Any, Dict
+
+from output_buffer import buffered_stdout
+from profiler import Profiler
+
+# Set MCP_TEST_VERBOSE=1 to print response/content previews
+VERBOSE = os.environ.get("MCP_TEST_VERBOSE") == "1"
+
+READ_CHUNK_SIZE = 65536
+
+# Upper bound on server startup (embedding model load) before initialize is answered
+STARTUP_TIMEOUT = 30.0
+
+INIT_PARAMS = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {
+            "listChanged": True
+        },
+        "resources": {
+            "subscribe": True,
+            "listChanged": True
+        }
+    },
+    "clientInfo": {
+        "name": "cursor",
+        "version": "1.0.0"
+    }
+}
+
+SEARCH_PARAMS = {
+    "name": "search_voiceflow_docs",
+    "arguments": {
+        "query": "API authentication",
+        "limit": 3
+    }
+}
+
+GET_PAGE_PARAMS = {
+    "name": "get_voiceflow_doc_page",
+    "arguments": {
+        "url": "https://docs.voiceflow.com/docs/authentication"
+    }
+}
+
+QA_PARAMS = {
+    "name": "ask_voiceflow_question",
+    "arguments": {
+        "question": "How do I authenticate with the Voiceflow API?"
+    }
+}
+
+TOPICS_PARAMS = {
+    "name": "list_voiceflow_topics",
+    "arguments": {}
+}
+
+# Requests this simulator sends repeatedly; their bodies are encoded once.
+# tools/call entries are keyed by tool name since they share a method
+KNOWN_CALLS = {
+    "initialize": ("initialize", INIT_PARAMS),
+    "tools/list": ("tools/list", {}),
+    SEARCH_PARAMS["name"]: ("tools/call", SEARCH_PARAMS),
+    GET_PAGE_PARAMS["name"]: ("tools/call", GET_PAGE_PARAMS),
+    QA_PARAMS["name"]: ("tools/call", QA_PARAMS),
+    TOPICS_PARAMS["name"]: ("tools/call", TOPICS_PARAMS),
+}
+
+def _call_key(method: str, params: Dict[str, Any]) -> str:
+    """Key a request into KNOWN_CALLS"""
+    return params["name"] if method == "tools/call" and params else method
 
 class MCPClientSimulator:
     """Simulates how Cursor would communicate with the MCP server"""
@@ -17,84 +87,117 @@ class MCPClientSimulator:
     def __init__(self):
         self.process = None
         self.request_id = 1
+        self._rxbuf = bytearray()
+        self._router: Dict[int, asyncio.Future] = {}
+        self._router_task = None
+        self.profiler = Profiler()
+        # Everything but the id, pre-encoded: b'"jsonrpc": "2.0", "method": ..., "params": {...}}'
+        self._templates = {
+            key: json.dumps({"jsonrpc": "2.0", "method": method, "params": params}).encode()[1:]
+            for key, (method, params) in KNOWN_CALLS.items()
+        }
     
     async def start_server(self):
         """Start the MCP server process"""
-        self.process = subprocess.Popen(
-            [sys.executable, "voiceflow_mcp_server.py"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=0  # Unbuffered
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "voiceflow_mcp_server.py",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
+        # One reader owns stdout and hands each response to whoever is waiting on its id
+        self._router_task = asyncio.create_task(self._route_responses())
         print("🚀 Started Voiceflow MCP Server")
-        await asyncio.sleep(2)  # Give server time to initialize
+        # No fixed sleep: the initialize response doubles as the readiness signal
     
-    def send_request(self, method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Send a JSON-RPC request to the MCP server"""
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": method,
-            "params": params or {}
-        }
+    async def send_request(self, method: str, params: Dict[str, Any] = None) -> asyncio.Future:
+        """Send a JSON-RPC request and return a future for its response"""
+        params = params or {}
+        key = _call_key(method, params)
+        if key in self._templates and KNOWN_CALLS[key] == (method, params):
+            # Splice the id into the pre-encoded body instead of re-serializing it
+            frame = b'{"id": %d, ' % self.request_id + self._templates[key] + b"\n"
+        else:
+            frame = (json.dumps({
+                "jsonrpc": "2.0",
+                "id": self.request_id,
+                "method": method,
+                "params": params
+            }) + "\n").encode()
+        
+        # Register before writing so a fast reply always finds its future
+        future = asyncio.get_running_loop().create_future()
+        self._router[self.request_id] = future
         
-        request_str = json.dumps(request) + "\n"
         print(f"📤 Sending: {method}")
         
-        self.process.stdin.write(request_str)
-        self.process.stdin.flush()
+        with self.profiler.span(f"send:{method}"):
+            self.process.stdin.write(frame)
+            await self.process.stdin.drain()
         
         self.request_id += 1
-        return request
+        return future
+    
+    async def read_frame(self) -> bytes:
+        """Return the next newline-delimited message from the server's stdout"""
+        scanned = 0
+        while True:
+            newline = self._rxbuf.find(b"\n", scanned)
+            if newline >= 0:
+                frame = bytes(self._rxbuf[:newline])
+                del self._rxbuf[:newline + 1]
+                return frame
+            scanned = len(self._rxbuf)
+            # Pull whatever the pipe has in large chunks; one read may hold several messages
+            chunk = await self.process.stdout.read(READ_CHUNK_SIZE)
+            if not chunk:
+                frame = bytes(self._rxbuf)
+                self._rxbuf.clear()
+                return frame
+            self._rxbuf += chunk
     
-    async def read_response(self, timeout: float = 5.0) -> Dict[str, Any]:
-        """Read a JSON-RPC response from the MCP server"""
+    async def _route_responses(self):
+        """Read responses until EOF and resolve the future registered for each id"""
+        while True:
+            frame = await self.read_frame()
+            if not frame:
+                break
+            if not frame.strip():
+                continue
+            try:
+                response = json.loads(frame)
+            except json.JSONDecodeError:
+                # Not a JSON-RPC message (stray log output); keep reading
+                continue
+            print(f"📥 Received: {response.get('method', 'response')}")
+            future = self._router.pop(response.get("id"), None)
+            if future and not future.done():
+                future.set_result(response)
+        
+        # Server went away: release everyone still waiting
+        for future in self._router.values():
+            if not future.done():
+                future.set_result({"error": "No response received"})
+        self._router.clear()
+    
+    async def read_response(self, future: asyncio.Future, timeout: float = 5.0) -> Dict[str, Any]:
+        """Wait for the response routed to `future`"""
         try:
-            # Read response with timeout
-            response_line = await asyncio.wait_for(
-                asyncio.to_thread(self.process.stdout.readline),
-                timeout=timeout
-            )
-            
-            if response_line.strip():
-                response = json.loads(response_line.strip())
-                print(f"📥 Received: {response.get('method', 'response')}")
-                return response
-            else:
-                return {"error": "No response received"}
-                
+            with self.profiler.span("read_response"):
+                return await asyncio.wait_for(future, timeout=timeout)
         except asyncio.TimeoutError:
             return {"error": "Response timeout"}
-        except json.JSONDecodeError as e:
-            return {"error": f"JSON decode error: {e}"}
-        except Exception as e:
-            return {"error": f"Read error: {e}"}
+    
+    async def call(self, method: str, params: Dict[str, Any] = None, timeout: float = 5.0) -> Dict[str, Any]:
+        """Send a request and wait for its response"""
+        return await self.read_response(await self.send_request(method, params), timeout=timeout)
     
     async def test_initialization(self):
         """Test the initialization handshake (like Cursor would do)"""
         print("\n🔧 Testing MCP Initialization...")
         
-        init_request = {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {
-                    "listChanged": True
-                },
-                "resources": {
-                    "subscribe": True,
-                    "listChanged": True
-                }
-            },
-            "clientInfo": {
-                "name": "cursor",
-                "version": "1.0.0"
-            }
-        }
-        
-        self.send_request("initialize", init_request)
-        response = await self.read_response()
+        # The request waits in the pipe until the server is up, so allow for model loading
+        response = await self.call("initialize", INIT_PARAMS, timeout=STARTUP_TIMEOUT)
         
         if "result" in response:
             print("✅ Initialization successful!")
@@ -109,8 +212,7 @@ class MCPClientSimulator:
         """Test listing available tools"""
         print("\n🛠️ Testing Tools List...")
         
-        self.send_request("tools/list")
-        response = await self.read_response()
+        response = await self.call("tools/list")
         
         if "result" in response and "tools" in response["result"]:
             tools = response["result"]["tools"]
@@ -126,21 +228,13 @@ class MCPClientSimulator:
         """Test searching Voiceflow documentation"""
         print("\n🔍 Testing Document Search...")
         
-        search_params = {
-            "name": "search_voiceflow_docs",
-            "arguments": {
-                "query": "API authentication",
-                "limit": 3
-            }
-        }
-        
-        self.send_request("tools/call", search_params)
-        response = await self.read_response(timeout=10.0)
+        response = await self.call("tools/call", SEARCH_PARAMS, timeout=10.0)
         
         if "result" in response and "content" in response["result"]:
             content = response["result"]["content"][0]["text"]
             print("✅ Search successful!")
-            print(f"   Results: {content[:200]}...")
+            if VERBOSE:
+                print(f"   Results: {content[:200]}...")
             return True
         else:
             print(f"❌ Search failed: {response}")
@@ -150,20 +244,13 @@ class MCPClientSimulator:
         """Test getting a specific documentation page"""
         print("\n📄 Testing Document Retrieval...")
         
-        get_params = {
-            "name": "get_voiceflow_doc_page",
-            "arguments": {
-                "url": "https://docs.voiceflow.com/docs/authentication"
-            }
-        }
-        
-        self.send_request("tools/call", get_params)
-        response = await self.read_response(timeout=10.0)
+        response = await self.call("tools/call", GET_PAGE_PARAMS, timeout=10.0)
         
         if "result" in response and "content" in response["result"]:
             content = response["result"]["content"][0]["text"]
             print("✅ Document retrieval successful!")
-            print(f"   Content: {content[:200]}...")
+            if VERBOSE:
+                print(f"   Content: {content[:200]}...")
             return True
         else:
             print(f"❌ Document retrieval failed: {response}")
@@ -173,20 +260,13 @@ class MCPClientSimulator:
         """Test asking a question about Voiceflow"""
         print("\n🤖 Testing Q&A...")
         
-        qa_params = {
-            "name": "ask_voiceflow_question",
-            "arguments": {
-                "question": "How do I authenticate with the Voiceflow API?"
-            }
-        }
-        
-        self.send_request("tools/call", qa_params)
-        response = await self.read_response(timeout=10.0)
+        response = await self.call("tools/call", QA_PARAMS, timeout=10.0)
         
         if "result" in response and "content" in response["result"]:
             content = response["result"]["content"][0]["text"]
             print("✅ Q&A successful!")
-            print(f"   Answer: {content[:200]}...")
+            if VERBOSE:
+                print(f"   Answer: {content[:200]}...")
             return True
         else:
             print(f"❌ Q&A failed: {response}")
@@ -196,29 +276,26 @@ class MCPClientSimulator:
         """Test listing documentation topics"""
         print("\n📚 Testing Topics List...")
         
-        topics_params = {
-            "name": "list_voiceflow_topics",
-            "arguments": {}
-        }
-        
-        self.send_request("tools/call", topics_params)
-        response = await self.read_response(timeout=10.0)
+        response = await self.call("tools/call", TOPICS_PARAMS, timeout=10.0)
         
         if "result" in response and "content" in response["result"]:
             content = response["result"]["content"][0]["text"]
             print("✅ Topics list successful!")
-            print(f"   Topics: {content[:200]}...")
+            if VERBOSE:
+                print(f"   Topics: {content[:200]}...")
             return True
         else:
             print(f"❌ Topics list failed: {response}")
             return False
     
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up the server process"""
-        if self.process:
+        if self.process and self.process.returncode is None:
             self.process.terminate()
-            self.process.wait()
+            await self.process.wait()
             print("🧹 Cleaned up server process")
+        if self._router_task:
+            await self._router_task
 
 async def main():
     """Main test function"""
@@ -233,32 +310,30 @@ async def main():
         
         # Run all tests
         tests_passed = 0
-        total_tests = 5
+        total_tests = 6
         
         # Test 1: Initialization
-        if await client.test_initialization():
-            tests_passed += 1
-        
-        # Test 2: List tools
-        tools = await client.test_list_tools()
-        if tools:
-            tests_passed += 1
-        
-        # Test 3: Search docs
-        if await client.test_search_docs():
+        with client.profiler.span("test:initialize"):
+            initialized = await client.test_initialization()
+        if initialized:
             tests_passed += 1
         
-        # Test 4: Get doc page
-        if await client.test_get_doc_page():
-            tests_passed += 1
+        # Tests 2-6: responses are matched by id, so issue them all at once
+        with client.profiler.span("test:tool_calls"):
+            tools_ok, *checks = await asyncio.gather(
+                client.test_list_tools(),
+                client.test_search_docs(),
+                client.test_get_doc_page(),
+                client.test_ask_question(),
+                client.test_list_topics(),
+            )
         
-        # Test 5: Ask question
-        if await client.test_ask_question():
+        # Test 2: List tools
+        if tools_ok:
             tests_passed += 1
         
-        # Test 6: List topics
-        if await client.test_list_topics():
-            tests_passed += 1
+        # Tests 3-6: Search docs, get doc page, ask question, list topics
+        tests_passed += sum(1 for ok in checks if ok)
         
         # Results
         print("\n" + "=" * 60)
@@ -276,7 +351,9 @@ async def main():
         print(f"❌ Test failed with error: {e}")
     
     finally:
-        client.cleanup()
+        await client.cleanup()
+        client.profiler.report()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with buffered_stdout():
+        asyncio.run(main())
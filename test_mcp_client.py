@@ -5,19 +5,38 @@ Simple test client for the Voiceflow MCP Server
 
 import asyncio
 import json
-import subprocess
+import os
 import sys
 
+from output_buffer import buffered_stdout
+
+# Set MCP_TEST_VERBOSE=1 to print response/content previews
+VERBOSE = os.environ.get("MCP_TEST_VERBOSE") == "1"
+
+# Page-sized reads for draining leftover pipe output
+READ_CHUNK_SIZE = 16384
+
+# Upper bound on server startup (embedding model load) before initialize is answered
+STARTUP_TIMEOUT = 30.0
+
+async def read_available(stream: asyncio.StreamReader, timeout: float = 0.1) -> str:
+    """Return whatever output is already buffered, waiting at most `timeout` seconds"""
+    try:
+        data = await asyncio.wait_for(stream.read(READ_CHUNK_SIZE), timeout=timeout)
+    except asyncio.TimeoutError:
+        return ""
+    return data.decode(errors="replace")
+
 async def test_mcp_server():
     """Test the MCP server by sending a simple request"""
+    process = None
     try:
         # Start the MCP server process
-        process = subprocess.Popen(
-            [sys.executable, "voiceflow_mcp_server.py"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "voiceflow_mcp_server.py",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
         
         # Send initialization request
@@ -37,16 +56,36 @@ async def test_mcp_server():
             }
         }
         
-        # Send the request
-        request_str = json.dumps(init_request) + "\n"
-        process.stdin.write(request_str)
-        process.stdin.flush()
+        # Send the request as raw bytes; the pipes carry no text-mode layer
+        process.stdin.write(json.dumps(init_request).encode() + b"\n")
+        await process.stdin.drain()
         
-        # Wait a moment for response
-        await asyncio.sleep(2)
+        # Wait for the initialize response instead of sleeping a fixed time
+        timed_out = False
+        try:
+            init_response = await asyncio.wait_for(
+                process.stdout.readline(),
+                timeout=STARTUP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            init_response = b""
+            timed_out = True
         
-        # Check if process is still running
-        if process.poll() is None:
+        if not init_response and not timed_out:
+            # stdout hit EOF: the server exited before answering, so report why
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=5.0)
+            except asyncio.TimeoutError:
+                stderr = b""
+            if process.returncode is None:
+                print("❌ MCP server closed stdout before answering initialize")
+            else:
+                print(f"❌ MCP server exited with code {process.returncode} before answering initialize")
+            if stderr:
+                print(f"Error: {stderr.decode(errors='replace')}")
+        elif timed_out:
+            print(f"❌ MCP server did not answer initialize within {STARTUP_TIMEOUT:.0f} seconds")
+        elif process.returncode is None:
             print("✅ MCP server is running successfully!")
             print("✅ Server initialized without errors")
             
@@ -58,34 +97,47 @@ async def test_mcp_server():
                 "params": {}
             }
             
-            request_str = json.dumps(tools_request) + "\n"
-            process.stdin.write(request_str)
-            process.stdin.flush()
-            
-            await asyncio.sleep(2)
+            process.stdin.write(json.dumps(tools_request).encode() + b"\n")
+            await process.stdin.drain()
             
-            # Read any available output
             try:
-                stdout, stderr = process.communicate(timeout=1)
-                if stdout:
-                    print(f"✅ Server response: {stdout[:200]}...")
-                if stderr:
-                    print(f"⚠️ Server stderr: {stderr[:200]}...")
-            except subprocess.TimeoutExpired:
+                tools_response = await asyncio.wait_for(
+                    process.stdout.readline(),
+                    timeout=5.0
+                )
+                print("✅ Server answered tools/list")
+                if VERBOSE:
+                    # Slice before decoding so only the preview is turned back into text
+                    print(f"   Response: {tools_response[:200].decode(errors='replace')}...")
+            except asyncio.TimeoutError:
+                print("⚠️ No tools/list response within 5 seconds")
+            
+            # Read any remaining output without closing stdin or blocking
+            stdout = await read_available(process.stdout)
+            stderr = await read_available(process.stderr)
+            if stdout and VERBOSE:
+                print(f"✅ Server response: {stdout[:200]}...")
+            if stderr:
+                print(f"⚠️ Server stderr: {stderr[:200]}...")
+            if not stdout and not stderr:
                 print("✅ Server is responsive (no immediate output expected)")
             
         else:
             print("❌ MCP server exited unexpectedly")
-            stdout, stderr = process.communicate()
+            stdout, stderr = await process.communicate()
             if stderr:
-                print(f"Error: {stderr}")
-        
-        # Clean up
-        process.terminate()
+                print(f"Error: {stderr.decode(errors='replace')}")
         
     except Exception as e:
         print(f"❌ Error testing MCP server: {e}")
+    
+    finally:
+        # Clean up
+        if process and process.returncode is None:
+            process.terminate()
+            await process.wait()
 
 if __name__ == "__main__":
     print("🧪 Testing Voiceflow MCP Server...")
-    asyncio.run(test_mcp_server())
+    with buffered_stdout():
+        asyncio.run(test_mcp_server())
@@ -5,15 +5,17 @@ Test script for the Voiceflow MCP Server
 
 import asyncio
 import json
+import os
+from output_buffer import buffered_stdout
 from voiceflow_mcp_server import VoiceflowMCP
 
-async def test_server():
+# Set MCP_TEST_VERBOSE=1 to print response/content previews
+VERBOSE = os.environ.get("MCP_TEST_VERBOSE") == "1"
+
+async def test_server(voiceflow: VoiceflowMCP):
     """Test the MCP server functionality"""
     print("🚀 Testing Voiceflow MCP Server...")
     
-    # Initialize the server
-    voiceflow = VoiceflowMCP()
-    
     # Test 1: Fetch sitemap
     print("\n📋 Testing sitemap fetching...")
     urls = await voiceflow.fetch_sitemap()
@@ -25,7 +27,8 @@ async def test_server():
     doc = await voiceflow.fetch_markdown_content(test_url)
     if doc:
         print(f"✅ Successfully fetched: {doc['title']}")
-        print(f"   Description: {doc['description'][:100]}...")
+        if VERBOSE:
+            print(f"   Description: {doc['description'][:100]}...")
     else:
         print("❌ Failed to fetch document")
     
@@ -40,17 +43,16 @@ async def test_server():
     print("\n🤖 Testing Q&A functionality...")
     qa_result = await voiceflow.answer_question("How do I authenticate with the Voiceflow API?")
     print(f"✅ Q&A result confidence: {qa_result['confidence']:.2f}")
-    print(f"   Answer preview: {qa_result['answer'][:200]}...")
+    if VERBOSE:
+        print(f"   Answer preview: {qa_result['answer'][:200]}...")
     print(f"   Sources: {len(qa_result['sources'])} documents")
     
     print("\n🎉 All tests completed!")
 
-async def test_tools():
+async def test_tools(voiceflow: VoiceflowMCP):
     """Test the MCP tools directly"""
     print("\n🛠️ Testing MCP Tools...")
     
-    voiceflow = VoiceflowMCP()
-    
     # Simulate tool calls
     tools_data = [
         {
@@ -92,13 +94,23 @@ async def test_tools():
         except Exception as e:
             print(f"   ❌ Error: {e}")
 
+async def main():
+    """Run both phases against one instance so the sitemap and page caches carry over"""
+    voiceflow = VoiceflowMCP()
+    try:
+        await test_server(voiceflow)
+        await test_tools(voiceflow)
+    finally:
+        # Close the pooled connections while the (only) event loop is still running
+        await voiceflow.http_client.aclose()
+
 if __name__ == "__main__":
     print("🧪 Voiceflow MCP Server Test Suite")
     print("=" * 50)
     
     # Run tests
-    asyncio.run(test_server())
-    asyncio.run(test_tools())
+    with buffered_stdout():
+        asyncio.run(main())
     
     print("\n✨ Test suite completed!")
     print("\nTo run the MCP server:")
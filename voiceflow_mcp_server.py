@@ -12,10 +12,18 @@ Perfect for Cursor AI development assistance!
 """
 
 import asyncio
+import hashlib
+import heapq
 import json
 import logging
+import math
+import os
+import random
 import re
-from typing import Any, Dict, List, Optional
+import time
+from collections import Counter, OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 import xml.etree.ElementTree as ET
 
@@ -32,25 +40,248 @@ from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+# HTTP/2 multiplexes warmup fetches over one connection; needs `pip install httpx[http2]`
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Used only to detect a CUDA device for the encoder
+try:
+    import torch
+    CUDA_AVAILABLE = torch.cuda.is_available()
+except ImportError:
+    CUDA_AVAILABLE = False
+
+# mmh3 hashes SimHash shingles faster; hashlib's blake2b is used without it
+try:
+    import mmh3
+    MMH3_AVAILABLE = True
+except ImportError:
+    MMH3_AVAILABLE = False
+
+# orjson (de)serializes the disk cache several times faster than json; json is used without it
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# FAISS gives SIMD top-k search over the chunk embeddings; NumPy is used without it
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How long a fetched sitemap is reused before it is downloaded again
+SITEMAP_TTL_SECONDS = 3600
+
+# Tries per page fetch on 429/5xx, and the upper bound on any single retry wait,
+# even if the server asks for longer
+FETCH_ATTEMPTS = 4
+MAX_RETRY_DELAY = 30.0
+
+# Documentation pages fetched at once during warmup
+WARMUP_CONCURRENCY = 16
+
+# Set VF_MCP_QUANTIZE_INDEX=1 to store the FAISS index as 8-bit scalar-quantized vectors
+QUANTIZE_INDEX = os.environ.get("VF_MCP_QUANTIZE_INDEX") == "1"
+
+# Set VF_MCP_CACHE_DIR to keep warmup snapshots and revalidatable page downloads
+# between runs (off by default, so nothing is written to disk)
+DISK_CACHE_DIR = os.path.expanduser(os.environ.get("VF_MCP_CACHE_DIR", ""))
+# A snapshot older than this is rebuilt so page edits are eventually picked up
+SNAPSHOT_TTL_SECONDS = 24 * 3600
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# "onnx" runs the encoder on ONNX Runtime (pip install "sentence-transformers[onnx]")
+EMBEDDING_BACKEND = os.environ.get("VF_MCP_EMBEDDING_BACKEND", "torch")
+
+# Texts per SentenceTransformer forward pass (a GPU takes bigger batches)
+EMBED_BATCH_SIZE = 64
+GPU_EMBED_BATCH_SIZE = 256
+# Recent search queries whose embeddings are kept
+QUERY_CACHE_SIZE = 1024
+
+# Characters of chunk text passed to the encoder; the model stops at 256 tokens (~1000 chars)
+EMBED_TEXT_CHARS = 1000
+
+# Chunks scored per block in search; 512 x 384 float32 is 768 KB, so each tile fits
+# in a typical per-core L2 (1-2 MB) while the query block is multiplied against it
+SIMILARITY_TILE = 512
+
+# Chunks whose 64-bit SimHash (over 5-token shingles) differs in at most this many
+# bits are treated as duplicates (shared nav, footers, API skeletons) and embedded once
+SIMHASH_SHINGLE = 5
+SIMHASH_MAX_DISTANCE = 3
+
+_SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+_SITEMAP_URL = _SITEMAP_NS + "url"
+_SITEMAP_LOC = _SITEMAP_NS + "loc"
+
+# Markdown patterns applied to every page and chunk, compiled once
+_RE_MULTI_BLANK = re.compile(r"\n\s*\n\s*\n")
+# A code fence line, or an h1-h3 heading line (horizontal whitespace only, so a
+# match never runs into the next line)
+_RE_CHUNK_BOUNDARY = re.compile(r"^(?:[^\S\n]*(?P<fence>```)|#{1,3}[^\S\n]).*$", re.M)
+_RE_HEADING_PREFIX = re.compile(r"^#{1,3}\s+")
+_RE_CODE_BLOCK = re.compile(r"```[\s\S]*?```")
+_RE_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+_RE_MD_PUNCT = re.compile(r"[#>*_`]")
+_RE_WHITESPACE = re.compile(r"\s+")
+_RE_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, as used by the inverted index"""
+    return _RE_TOKEN.findall(text.lower())
+
+def dump_json(obj: Any) -> bytes:
+    """Serialize obj to UTF-8 JSON for the disk cache"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+def load_json(data: bytes) -> Any:
+    """Parse JSON written by dump_json"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def looks_like_markdown(content_type: str, raw: bytes) -> bool:
+    """Markdown-ish response, judged from its content type or leading bytes without decoding"""
+    # some endpoints serve raw md with text/plain
+    return "markdown" in content_type or "text/plain" in content_type or raw.startswith(b"# ") or b"```" in raw
+
+def _hash64(text: str) -> int:
+    """Unsigned 64-bit hash of a shingle"""
+    if MMH3_AVAILABLE:
+        return mmh3.hash64(text, signed=False)[0]
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's token shingles; similar texts differ in few bits"""
+    tokens = tokenize(text)
+    if not tokens:
+        return 0
+    shingles = {" ".join(tokens[i:i + SIMHASH_SHINGLE])
+                for i in range(max(1, len(tokens) - SIMHASH_SHINGLE + 1))}
+    hashes = np.fromiter((_hash64(sh) for sh in shingles), dtype=">u8", count=len(shingles))
+    # Each bit is set when most shingle hashes have it set
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+class NearDuplicateFilter:
+    """Remembers SimHash fingerprints and flags ones within SIMHASH_MAX_DISTANCE bits"""
+    
+    def __init__(self):
+        # With at most 3 differing bits, one of the four 16-bit bands must match exactly,
+        # so only fingerprints sharing a band are compared
+        self.bands: List[Dict[int, List[int]]] = [{} for _ in range(SIMHASH_MAX_DISTANCE + 1)]
+    
+    def _bands(self, fp: int) -> List[int]:
+        width = 64 // len(self.bands)
+        return [(fp >> (i * width)) & ((1 << width) - 1) for i in range(len(self.bands))]
+    
+    def seen(self, fp: int) -> bool:
+        """True if a near-duplicate was already added; otherwise add this fingerprint"""
+        keys = self._bands(fp)
+        for band, key in zip(self.bands, keys):
+            for other in band.get(key, ()):
+                if bin(fp ^ other).count("1") <= SIMHASH_MAX_DISTANCE:
+                    return True
+        for band, key in zip(self.bands, keys):
+            band.setdefault(key, []).append(fp)
+        return False
+
+# Per-chunk metadata stored alongside the embedding matrix
+CHUNK_COLUMNS = ("url", "markdown_url", "title", "heading", "snippet")
+
 class DocumentCache:
     """Simple in-memory cache for documentation content"""
     def __init__(self):
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.embeddings: Optional[np.ndarray] = None
-        self.documents: List[Dict[str, Any]] = []
+        self.index = None  # FAISS index over `embeddings`, when faiss is installed
+        # Chunk metadata as parallel columns; row i describes embeddings[i]
+        self.chunk_columns: Dict[str, np.ndarray] = {name: np.empty(0, dtype=object) for name in CHUNK_COLUMNS}
+        # token -> {url: weighted term frequency}, kept in step with `cache`
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self._doc_tokens: Dict[str, List[str]] = {}
     
     def get(self, url: str) -> Optional[Dict[str, Any]]:
         return self.cache.get(url)
     
     def set(self, url: str, content: Dict[str, Any]) -> None:
+        self._unindex(url)
         self.cache[url] = content
+        self._index(url, content)
+    
+    def _index(self, url: str, content: Dict[str, Any]) -> None:
+        """Add a page to the token postings used by the text-search fallback"""
+        # Same weighting as a phrase hit: title 3, description 2, each content occurrence 1
+        weights = Counter(tokenize(content.get("content", "")))
+        for token in set(tokenize(content.get("title", ""))):
+            weights[token] += 3
+        for token in set(tokenize(content.get("description", ""))):
+            weights[token] += 2
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[url] = weight
+        self._doc_tokens[url] = list(weights)
+    
+    def _unindex(self, url: str) -> None:
+        for token in self._doc_tokens.pop(url, ()):
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.pop(url, None)
+                if not docs:
+                    del self.postings[token]
+    
+    def set_chunks(self, columns: Dict[str, List[str]]) -> None:
+        """Replace the chunk metadata columns"""
+        self.chunk_columns = {name: np.array(columns[name], dtype=object) for name in CHUNK_COLUMNS}
+    
+    def chunk_count(self) -> int:
+        return len(self.chunk_columns["url"])
     
     def has_embeddings(self) -> bool:
-        return self.embeddings is not None and len(self.documents) > 0
+        return self.embeddings is not None and self.chunk_count() > 0
+
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's Retry-After, else jittered backoff"""
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(max(0.0, float(retry_after)), MAX_RETRY_DELAY)
+        except ValueError:
+            try:
+                # HTTP-date form
+                wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(wait, 0.0), MAX_RETRY_DELAY)
+            except (TypeError, ValueError):
+                pass
+    # Random jitter keeps concurrent warmup fetches from retrying in lockstep
+    return 0.25 * (2 ** attempt) + random.uniform(0, 0.25 * (2 ** attempt))
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client used to talk to docs.voiceflow.com"""
+    # Pool and protocol settings live on the transport, which also retries failed connects
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=30),
+        retries=2
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        headers={"User-Agent": "voiceflow-mcp/1.0 (+https://github.com/voiceflow/mcp-server)"}
+    )
 
 class VoiceflowMCP:
     def __init__(self):
@@ -58,35 +289,65 @@ class VoiceflowMCP:
         self.sitemap_url = "https://docs.voiceflow.com/sitemap.xml"
         self.cache = DocumentCache()
         self.embedding_model = None
-        self.http_client = httpx.AsyncClient(
-            timeout=30.0, 
-            headers={"User-Agent": "voiceflow-mcp/1.0 (+https://github.com/voiceflow/mcp-server)"}
-        )
+        self.device = "cuda" if CUDA_AVAILABLE else "cpu"
+        self.embed_batch_size = GPU_EMBED_BATCH_SIZE if CUDA_AVAILABLE else EMBED_BATCH_SIZE
+        self._gpu_resources = None  # faiss GPU memory pool, created with the first GPU index
+        self._query_cache: OrderedDict = OrderedDict()  # query -> embedding, LRU order
+        self._sitemap_urls: Optional[List[str]] = None
+        self._sitemap_fetched_at = 0.0
+        self.http_client = create_http_client()
         
         # Initialize embedding model for semantic search
         try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = self.load_embedding_model()
             logger.info("Loaded embedding model for semantic search")
         except Exception as e:
             logger.warning(f"Could not load embedding model: {e}")
     
+    def load_embedding_model(self) -> SentenceTransformer:
+        """Load the encoder, on ONNX Runtime when VF_MCP_EMBEDDING_BACKEND=onnx"""
+        if EMBEDDING_BACKEND != "torch":
+            try:
+                # Same encode() API; ONNX Runtime runs the graph with fused CPU kernels
+                return SentenceTransformer(EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND, device=self.device)
+            except Exception as e:
+                # Older sentence-transformers, or onnxruntime/optimum not installed
+                logger.warning(f"Could not load {EMBEDDING_BACKEND} backend, using torch: {e}")
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device=self.device)
+    
     async def fetch_sitemap(self) -> List[str]:
         """Fetch and parse the sitemap to get all documentation URLs"""
+        if self._sitemap_urls is not None and time.monotonic() - self._sitemap_fetched_at < SITEMAP_TTL_SECONDS:
+            return list(self._sitemap_urls)
+        
         try:
-            response = await self.http_client.get(self.sitemap_url)
-            response.raise_for_status()
-            
-            root = ET.fromstring(response.text)
             urls = []
+            parser = ET.XMLPullParser(["end"])
+            
+            def collect():
+                # Take each <url>'s <loc> as soon as it closes, then drop its subtree
+                for _, url_elem in parser.read_events():
+                    if url_elem.tag != _SITEMAP_URL:
+                        continue
+                    loc_elem = url_elem.find(_SITEMAP_LOC)
+                    if loc_elem is not None and loc_elem.text:
+                        urls.append(loc_elem.text)
+                    url_elem.clear()
             
-            # Parse XML sitemap
-            for url_elem in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-                loc_elem = url_elem.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
-                if loc_elem is not None and loc_elem.text:
-                    urls.append(loc_elem.text)
+            # Parse XML sitemap incrementally as it downloads
+            async with self.http_client.stream("GET", self.sitemap_url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    parser.feed(chunk)
+                    collect()
+            parser.close()
+            collect()
             
             logger.info(f"Found {len(urls)} URLs in sitemap")
-            return urls
+            if urls:
+                self._sitemap_urls = urls
+                self._sitemap_fetched_at = time.monotonic()
+            return list(urls)
             
         except Exception as e:
             logger.error(f"Error fetching sitemap: {e}")
@@ -98,43 +359,48 @@ class VoiceflowMCP:
         if cached:
             return cached
 
-        async def _get(u: str) -> Optional[httpx.Response]:
+        async def _get(u: str) -> Optional[str]:
+            """Return the markdown body of u, revalidating any copy cached on disk"""
             headers = {"Accept": "text/markdown, text/plain, */*"}
-            for attempt in range(4):
+            stored = self._load_http_entry(u)
+            if stored:
+                if stored.get("etag"):
+                    headers["If-None-Match"] = stored["etag"]
+                if stored.get("last_modified"):
+                    headers["If-Modified-Since"] = stored["last_modified"]
+            for attempt in range(FETCH_ATTEMPTS):
                 r = await self.http_client.get(u, headers=headers, follow_redirects=True)
                 if r.status_code == 429 or 500 <= r.status_code < 600:
-                    await asyncio.sleep(0.5 * (2 ** attempt))
+                    # No point waiting out Retry-After when no retry follows
+                    if attempt < FETCH_ATTEMPTS - 1:
+                        await asyncio.sleep(retry_delay(r, attempt))
                     continue
+                if r.status_code == 304 and stored:
+                    # Entries written before bodies were checked up front may hold HTML
+                    if looks_like_markdown(stored.get("content_type", ""), stored["body"].encode()):
+                        return stored["body"]
+                    return None
                 if r.is_success:
-                    return r
+                    ctype = (r.headers.get("content-type") or "").lower()
+                    # Judge the raw bytes first so rejected (HTML) pages are never decoded
+                    if not looks_like_markdown(ctype, r.content):
+                        return None
+                    body = r.text
+                    self._save_http_entry(u, r, ctype, body)
+                    return body
                 break
             return None
 
         md_url = url if url.endswith(".md") else f"{url}.md"
 
         # 1) Try .md
-        r = await _get(md_url)
-        body = None
+        body = await _get(md_url)
         final_url = md_url
-        if r is not None:
-            ctype = (r.headers.get("content-type") or "").lower()
-            body = r.text
-            # accept markdown-ish even if served as text/plain
-            if ("markdown" in ctype) or ("text/plain" in ctype) or body.startswith("# ") or "```" in body:
-                pass
-            else:
-                body = None
 
         # 2) Fallback to original URL
         if body is None:
-            r2 = await _get(url)
-            if r2 is not None and r2.is_success:
-                ctype = (r2.headers.get("content-type") or "").lower()
-                text2 = r2.text
-                # some endpoints serve raw md with text/plain
-                if ("markdown" in ctype) or ("text/plain" in ctype) or text2.startswith("# ") or "```" in text2:
-                    body = text2
-                    final_url = url
+            body = await _get(url)
+            final_url = url
 
         if body is None:
             logger.warning(f"No markdown found for {url}")
@@ -142,10 +408,7 @@ class VoiceflowMCP:
 
         title = self.extract_title(body)
         description = self.extract_description(body)
-        cleaned = self.clean_markdown(body)
-        
-        # Create chunks for better search
-        chunks = self.chunk_markdown(cleaned)
+        cleaned, chunks = self.normalize_and_chunk(body, title)
 
         doc_data = {
             "url": url,                # canonical
@@ -160,6 +423,45 @@ class VoiceflowMCP:
         logger.info(f"Fetched (MD): {title} — {final_url}")
         return doc_data
     
+    def _http_entry_path(self, url: str) -> Optional[str]:
+        """On-disk location of the conditional-GET cache entry for url"""
+        # Opt-in like the warmup snapshot: without a cache dir pages are never stored
+        if not DISK_CACHE_DIR:
+            return None
+        return os.path.join(DISK_CACHE_DIR, "pages", hashlib.sha1(url.encode()).hexdigest() + ".json")
+    
+    def _load_http_entry(self, url: str) -> Optional[Dict[str, str]]:
+        """Body and validators saved from an earlier fetch of url"""
+        path = self._http_entry_path(url)
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return load_json(f.read())
+        except (OSError, ValueError):
+            return None
+    
+    def _save_http_entry(self, url: str, response: httpx.Response, content_type: str, body: str) -> None:
+        """Remember a response body with its ETag/Last-Modified for later revalidation"""
+        path = self._http_entry_path(url)
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        # Without a validator the server can't answer 304, so there is nothing to gain
+        if not path or not (etag or last_modified):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(dump_json({
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "content_type": content_type,
+                    "body": body
+                }))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"Could not cache {url} on disk: {e}")
+    
     def extract_title(self, content: str) -> str:
         """Extract title from markdown content"""
         lines = content.split('\n')
@@ -192,128 +494,389 @@ class VoiceflowMCP:
                 content = parts[2]
         
         # Remove excessive whitespace
-        content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
+        content = _RE_MULTI_BLANK.sub('\n\n', content)
         
         return content.strip()
     
+    def normalize_and_chunk(self, body: str, title: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Clean a page, chunk it, and prepare each chunk's embedding text in one go"""
+        cleaned = self.clean_markdown(body)
+        # Create chunks for better search
+        chunks = self.chunk_markdown(cleaned)
+        # Done here, once per page, so rebuilding embeddings never re-runs the text regexes
+        for chunk in chunks:
+            chunk["embed_text"] = self.embed_text(title, chunk)
+            chunk["simhash"] = simhash(chunk["markdown"])
+        return cleaned, chunks
+    
     def chunk_markdown(self, md: str) -> List[Dict[str, Any]]:
         """Chunk markdown by headings for better search granularity"""
+        # Normalize line endings once so chunks can be sliced straight out of the text
+        md = "\n".join(md.splitlines())
         chunks = []
-        lines = md.splitlines()
-        buf, current_h = [], None
+        start, current_h = 0, ""
         in_code = False
 
-        def flush():
-            if not buf: return
-            text = "\n".join(buf).strip()
-            if text:
-                chunks.append({"heading": current_h or "", "markdown": text})
-            buf.clear()
-
-        for ln in lines:
-            if ln.strip().startswith("```"):
+        # Only fence and heading lines matter; the regex engine skips everything else
+        for m in _RE_CHUNK_BOUNDARY.finditer(md):
+            if m.group("fence"):
                 in_code = not in_code
-                buf.append(ln)
-                continue
-            if not in_code and re.match(r"^#{1,3}\s", ln):
-                flush()
-                current_h = re.sub(r"^#{1,3}\s+", "", ln).strip()
-                buf.append(ln)
-            else:
-                buf.append(ln)
-        flush()
+            elif not in_code:
+                text = md[start:m.start()].strip()
+                if text:
+                    chunks.append({"heading": current_h, "markdown": text})
+                start = m.start()
+                current_h = _RE_HEADING_PREFIX.sub("", m.group()).strip()
+        text = md[start:].strip()
+        if text:
+            chunks.append({"heading": current_h, "markdown": text})
         return chunks
     
     async def search_documents(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search through cached documents using semantic similarity"""
+        return (await self.search_documents_batch([query], limit))[0]
+    
+    async def search_documents_batch(self, queries: List[str], limit: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once, sharing a single embedding pass"""
         if not self.cache.has_embeddings():
             await self.build_embeddings()
         if not self.embedding_model or not self.cache.has_embeddings():
-            return await self.simple_search(query, limit)
+            return [await self.simple_search(query, limit) for query in queries]
 
-        q = self.embedding_model.encode([query])
-        sims = np.dot(self.cache.embeddings, q.T).flatten()
-        idxs = np.argsort(sims)[::-1][:limit]
+        q = self.encode_queries(queries)
+        if self.cache.index is not None:
+            top_idxs, top_sims = self._search_index(q, limit)
+        else:
+            top_idxs, top_sims = self._top_k(q, limit)
 
-        results = []
-        for i in idxs:
-            doc = self.cache.documents[i]
-            results.append({**doc, "similarity": float(sims[i])})
-        return results
+        columns = self.cache.chunk_columns
+        batch_results = []
+        for idxs, sims in zip(top_idxs, top_sims):
+            # Gather each column for the hits at once, then zip them into result rows
+            hits = [columns[name][idxs] for name in CHUNK_COLUMNS]
+            batch_results.append([
+                {**dict(zip(CHUNK_COLUMNS, row)), "similarity": sim}
+                for *row, sim in zip(*hits, sims.tolist())
+            ])
+        return batch_results
+    
+    def _search_index(self, q: np.ndarray, limit: int):
+        """Top-k chunk indices and scores per query row from the FAISS index"""
+        k = min(limit, self.cache.index.ntotal)
+        if k <= 0:
+            empty = np.empty((q.shape[0], 0))
+            return empty.astype(np.intp), empty
+        sims, idxs = self.cache.index.search(np.ascontiguousarray(q, dtype=np.float32), k)
+        return idxs, sims
+    
+    def _top_k(self, q: np.ndarray, limit: int):
+        """Return the best chunk indices and scores per query row, best first"""
+        embeddings = self.cache.embeddings
+        n = embeddings.shape[0]
+        k = min(limit, n)
+        if k <= 0:
+            empty = np.empty((q.shape[0], 0))
+            return empty.astype(np.intp), empty
+        
+        # Score one tile of chunks at a time so the (tile, D) block stays in cache,
+        # keeping only each tile's local top k as candidates
+        cand_idxs, cand_sims = [], []
+        for start in range(0, n, SIMILARITY_TILE):
+            sims = q @ embeddings[start:start + SIMILARITY_TILE].T
+            tile_k = min(k, sims.shape[1])
+            local = np.argpartition(sims, -tile_k, axis=1)[:, -tile_k:]
+            cand_idxs.append(local + start)
+            cand_sims.append(np.take_along_axis(sims, local, axis=1))
+        cand_idxs = np.concatenate(cand_idxs, axis=1)
+        cand_sims = np.concatenate(cand_sims, axis=1)
+        
+        # Merge the per-tile candidates into the global top k, ordered by score
+        order = np.argsort(-cand_sims, axis=1)[:, :k]
+        return np.take_along_axis(cand_idxs, order, axis=1), np.take_along_axis(cand_sims, order, axis=1)
     
     async def simple_search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Simple text-based search fallback"""
-        query_lower = query.lower()
-        results = []
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
         
-        for url, doc_data in self.cache.cache.items():
-            score = 0
-            
-            # Check title
-            if query_lower in doc_data.get("title", "").lower():
-                score += 3
-            
-            # Check description
-            if query_lower in doc_data.get("description", "").lower():
-                score += 2
-            
-            # Check content
-            content_lower = doc_data.get("content", "").lower()
-            if query_lower in content_lower:
-                score += content_lower.count(query_lower)
-            
-            if score > 0:
-                results.append({
-                    **doc_data,
-                    "similarity": score / 10.0  # Normalize score
-                })
+        # Pages containing every query token: intersect postings, rarest token first
+        postings = [self.cache.postings.get(token, {}) for token in tokens]
+        postings.sort(key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for docs in postings[1:]:
+            candidates.intersection_update(docs)
+            if not candidates:
+                return []
         
-        # Sort by score and return top results
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:limit]
+        # Weighted term frequency scaled by how rare each token is across cached pages
+        n_docs = len(self.cache.cache)
+        idf = [math.log(1 + n_docs / len(docs)) for docs in postings]
+        scored = (
+            (sum(weight * docs[url] for weight, docs in zip(idf, postings)), url)
+            for url in candidates
+        )
+        top = heapq.nlargest(limit, scored)
+        
+        return [
+            {**self.cache.cache[url], "similarity": score / 10.0}  # Normalize score
+            for score, url in top
+        ]
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in fixed-size batches as L2-normalized vectors"""
+        return self.embedding_model.encode(
+            texts,
+            batch_size=self.embed_batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
     
-    async def build_embeddings(self) -> None:
-        """Build embeddings for all cached documents using chunks"""
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed search queries, reusing vectors for queries seen recently"""
+        missing = [q for q in dict.fromkeys(queries) if q not in self._query_cache]
+        if missing:
+            for query, vector in zip(missing, np.asarray(self.encode(missing), dtype=np.float32)):
+                vector.flags.writeable = False  # shared between calls, so never mutated
+                self._query_cache[query] = vector
+        
+        vectors = []
+        for query in queries:
+            self._query_cache.move_to_end(query)
+            vectors.append(self._query_cache[query])
+        while len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return np.stack(vectors)
+    
+    def build_index(self, embeddings: np.ndarray):
+        """Build an inner-product FAISS index, or None without faiss"""
+        if not FAISS_AVAILABLE:
+            return None
+        dim = embeddings.shape[1]
+        if QUANTIZE_INDEX:
+            # One byte per dimension: 4x less memory to scan than float32
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+        else:
+            index = faiss.IndexFlatIP(dim)
+        if self.device == "cuda" and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+            # faiss-gpu build: keep the index next to the encoder so search stays on the device
+            self._gpu_resources = faiss.StandardGpuResources()
+            index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+        index.add(embeddings)
+        return index
+    
+    def embed_text(self, title: str, chunk: Dict[str, Any]) -> str:
+        """Text for embedding: title + heading + stripped markdown (light cleanup)"""
+        t = f"{title} – {chunk.get('heading','')}\n" + _RE_CODE_BLOCK.sub(" ", chunk["markdown"])
+        t = _RE_MD_LINK.sub(r"\1", t)
+        t = _RE_MD_PUNCT.sub(" ", t)
+        t = _RE_WHITESPACE.sub(" ", t).strip()
+        if len(t) > EMBED_TEXT_CHARS:
+            # Cut at the last space so the encoder never sees half a word
+            cut = t.rfind(" ", 0, EMBED_TEXT_CHARS + 1)
+            t = t[:cut if cut > 0 else EMBED_TEXT_CHARS]
+        return t
+    
+    def chunk_texts(self, doc: Dict[str, Any], seen: NearDuplicateFilter) -> List[Tuple[str, Dict[str, Any]]]:
+        """(embedding text, chunk) for each chunk of a page worth embedding
+        
+        Chunks that are near-duplicates of one already in `seen` are skipped.
+        """
+        pairs = []
+        for ch in doc.get("chunks", []):
+            # Prepared once at fetch time; pages restored from older snapshots may lack them
+            t = ch.get("embed_text")
+            if t is None:
+                t = self.embed_text(doc.get("title", ""), ch)
+            fp = ch.get("simhash")
+            if fp is None:
+                fp = simhash(ch["markdown"])
+            if t and not (fp and seen.seen(fp)):
+                pairs.append((t, ch))
+        return pairs
+    
+    async def build_embeddings(self, encoded: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """Build embeddings for all cached documents using chunks
+        
+        `encoded` maps embedding text -> vector for chunks already embedded (by the
+        warmup pipeline); only the remaining texts are encoded here.
+        """
         if not self.embedding_model:
             return
-        docs, texts = [], []
+        encoded = encoded or {}
+        columns: Dict[str, List[str]] = {name: [] for name in CHUNK_COLUMNS}
+        texts = []
+        seen = NearDuplicateFilter()
         for url, doc in self.cache.cache.items():
-            for idx, ch in enumerate(doc.get("chunks", [])):
-                # text for embedding: heading + stripped markdown (light cleanup)
-                t = f"{doc.get('title','')} – {ch.get('heading','')}\n" + \
-                    re.sub(r"```[\s\S]*?```", " ", ch["markdown"])
-                t = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", t)
-                t = re.sub(r"[#>*_`]", " ", t)
-                t = re.sub(r"\s+", " ", t).strip()
-                if t:
-                    texts.append(t[:1000])
-                    docs.append({
-                        "url": url,
-                        "markdown_url": doc.get("markdown_url", url),
-                        "title": doc.get("title", ""),
-                        "heading": ch.get("heading", ""),
-                        "snippet": ch["markdown"][:500],
-                    })
+            for t, ch in self.chunk_texts(doc, seen):
+                texts.append(t)
+                columns["url"].append(url)
+                columns["markdown_url"].append(doc.get("markdown_url", url))
+                columns["title"].append(doc.get("title", ""))
+                columns["heading"].append(ch.get("heading", ""))
+                columns["snippet"].append(ch["markdown"][:500])
         if texts:
-            self.cache.embeddings = self.embedding_model.encode(texts)
-            self.cache.documents = docs
-            logger.info(f"Built embeddings for {len(docs)} chunks across {len(self.cache.cache)} pages")
+            missing = [t for t in dict.fromkeys(texts) if t not in encoded]
+            if missing:
+                encoded = {**encoded, **dict(zip(missing, self.encode(missing)))}
+            # Unit-length rows so a dot product is cosine similarity; contiguous
+            # float32 so every search is a single matrix product
+            self.cache.embeddings = np.ascontiguousarray(np.stack([encoded[t] for t in texts]), dtype=np.float32)
+            self.cache.index = self.build_index(self.cache.embeddings)
+            self.cache.set_chunks(columns)
+            logger.info(f"Built embeddings for {len(texts)} chunks across {len(self.cache.cache)} pages")
+    
+    async def _embed_pages(self, queue: asyncio.Queue, encoded: Dict[str, np.ndarray]) -> None:
+        """Encode pages from the warmup queue in batches while fetching continues"""
+        batch: List[str] = []
+        seen = NearDuplicateFilter()
+        
+        async def flush():
+            # Off the event loop so fetches keep flowing while the encoder runs
+            vectors = await asyncio.get_running_loop().run_in_executor(None, self.encode, list(batch))
+            encoded.update(zip(batch, vectors))
+            batch.clear()
+        
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            _, doc = item
+            batch.extend(t for t, _ in self.chunk_texts(doc, seen))
+            # Encode a full batch, or whatever is waiting once the queue runs dry
+            if batch and (len(batch) >= self.embed_batch_size or queue.empty()):
+                await flush()
+        if batch:
+            await flush()
     
     async def warmup(self, limit: int = 120) -> None:
         """Warmup by fetching key documentation pages and building embeddings"""
-        urls = await self.fetch_sitemap()
-        # prioritize /reference and /docs first
-        urls = [u for u in urls if u.startswith(self.base_url + "/reference")] + \
-               [u for u in urls if u.startswith(self.base_url + "/docs")] + \
-               [u for u in urls if "/changelog" not in u]
-        seen = 0
-        for u in urls:
-            if seen >= limit:
-                break
-            doc = await self.fetch_markdown_content(u)
-            if doc:
-                seen += 1
-        await self.build_embeddings()
+        urls = self.prioritize_urls(await self.fetch_sitemap())
+        
+        snapshot = self._snapshot_path(urls, limit)
+        if snapshot and self.load_snapshot(snapshot):
+            return
+        
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+        # Fetched pages stream to the encoder instead of waiting for the last download
+        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+        encoded: Dict[str, np.ndarray] = {}
+
+        # The encoder runs as its own task so it overlaps the fetch waves below
+        encoder = asyncio.create_task(self._embed_pages(queue, encoded)) if self.embedding_model else None
+
+        async def _fetch_one(url: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                doc = await self.fetch_markdown_content(url)
+            if doc and encoder and not encoder.done():
+                await queue.put((url, doc))
+            return doc
+
+        try:
+            seen, pos = 0, 0
+            # Fetch in concurrent waves sized to the pages still missing, so failed
+            # URLs are topped up from the next ones in priority order
+            while seen < limit and pos < len(urls):
+                wave = urls[pos:pos + limit - seen]
+                pos += len(wave)
+                results = await asyncio.gather(*(_fetch_one(u) for u in wave), return_exceptions=True)
+                for u, doc in zip(wave, results):
+                    if isinstance(doc, Exception):
+                        logger.warning(f"Warmup fetch failed for {u}: {doc}")
+                    elif doc:
+                        seen += 1
+            if encoder:
+                if not encoder.done():
+                    await queue.put(None)  # end of stream
+                await encoder
+        finally:
+            if encoder and not encoder.done():
+                encoder.cancel()
+        
+        # Assemble the matrix; only pages the pipeline didn't see are encoded here
+        await self.build_embeddings(encoded)
+        # A degraded warmup would otherwise be served from disk for SNAPSHOT_TTL_SECONDS
+        if snapshot and seen >= min(limit, len(urls)):
+            self.save_snapshot(snapshot)
+        elif snapshot:
+            logger.warning(f"Not saving warmup snapshot: only {seen} of {limit} pages fetched")
+    
+    def prioritize_urls(self, urls: List[str]) -> List[str]:
+        """Unique URLs ordered /reference, then /docs, then the rest; changelog pages dropped"""
+        reference, docs = self.base_url + "/reference", self.base_url + "/docs"
+        
+        def priority(u: str) -> int:
+            if u.startswith(reference):
+                return 0
+            if u.startswith(docs):
+                return 1
+            return 2
+        
+        # dict.fromkeys dedupes in sitemap order; the stable sort keeps that order per tier
+        unique = [u for u in dict.fromkeys(urls) if "/changelog" not in u or priority(u) < 2]
+        return sorted(unique, key=priority)
+    
+    def _snapshot_path(self, urls: List[str], limit: int) -> Optional[str]:
+        """Path prefix of the warmup snapshot for this URL set, or None if disabled"""
+        if not DISK_CACHE_DIR or not urls or not self.embedding_model:
+            return None
+        key = hashlib.sha1(
+            "\n".join([EMBEDDING_MODEL_NAME, str(limit)] + sorted(set(urls))).encode()
+        ).hexdigest()
+        return os.path.join(DISK_CACHE_DIR, f"warmup-{key}")
+    
+    def load_snapshot(self, path: str) -> bool:
+        """Restore pages and embeddings saved by a previous warmup"""
+        try:
+            if time.time() - os.path.getmtime(path + ".npy") > SNAPSHOT_TTL_SECONDS:
+                return False
+            with open(path + ".json", "rb") as f:
+                data = load_json(f.read())
+            # Memory-mapped: pages of the matrix are read lazily by the OS
+            embeddings = np.load(path + ".npy", mmap_mode="r")
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable warmup snapshot {path}: {e}")
+            return False
+        
+        if not isinstance(data, dict):
+            return False
+        columns = data.get("chunks")
+        pages = data.get("pages")
+        if not isinstance(columns, dict) or not isinstance(pages, dict):
+            return False
+        if any(len(columns.get(name, ())) != embeddings.shape[0] for name in CHUNK_COLUMNS):
+            return False
+        for url, doc in pages.items():
+            self.cache.set(url, doc)
+        self.cache.embeddings = embeddings
+        self.cache.index = self.build_index(embeddings)
+        self.cache.set_chunks(columns)
+        logger.info(f"Loaded warmup snapshot: {len(pages)} pages, {self.cache.chunk_count()} chunks")
+        return True
+    
+    def save_snapshot(self, path: str) -> None:
+        """Write pages and embeddings so the next start can skip warmup"""
+        if not self.cache.has_embeddings():
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to temp files and rename so a crash never leaves a half-written snapshot
+            with open(path + ".json.tmp", "wb") as f:
+                f.write(dump_json({
+                    "pages": self.cache.cache,
+                    "chunks": {name: column.tolist() for name, column in self.cache.chunk_columns.items()}
+                }))
+            with open(path + ".npy.tmp", "wb") as f:
+                np.save(f, self.cache.embeddings)
+            os.replace(path + ".json.tmp", path + ".json")
+            os.replace(path + ".npy.tmp", path + ".npy")
+        except OSError as e:
+            logger.warning(f"Could not save warmup snapshot {path}: {e}")
     
     async def get_documentation_page(self, url: str) -> Optional[Dict[str, Any]]:
         """Get a specific documentation page"""
@@ -323,7 +886,10 @@ class VoiceflowMCP:
         """Answer a question about Voiceflow using documentation"""
         # Search for relevant documents
         relevant_docs = await self.search_documents(question, limit=3)
-        
+        return self.compose_answer(relevant_docs)
+    
+    def compose_answer(self, relevant_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build an answer from already-retrieved search results"""
         if not relevant_docs:
             return {
                 "answer": "I couldn't find relevant information in the Voiceflow documentation.",
@@ -524,16 +1090,19 @@ async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> List[dict]:
 
 async def main():
     """Main entry point"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="voiceflow-docs",
-                server_version="1.0.0",
-                capabilities=app.get_capabilities()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="voiceflow-docs",
+                    server_version="1.0.0",
+                    capabilities=app.get_capabilities()
+                )
             )
-        )
+    finally:
+        await voiceflow.http_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())